@@ -5,194 +5,405 @@ Safely fixes user_id column types from INTEGER/SERIAL to BIGINT at startup
 """
 
 import logging
+import threading
+from contextlib import contextmanager, nullcontext
 from db_connection import get_db_connection
+from migration import is_migration_applied, mark_migration_applied
+from fix_emoji_encoding import RANK_EMOJIS_MIGRATION, fix_rank_emojis as fix_emoji_encoding
 
 logger = logging.getLogger(__name__)
 
-def auto_migrate_notification_tables():
+# Resolved once at import; the database backend doesn't change at runtime
+db_conn = get_db_connection()
+PLACEHOLDER = db_conn.get_placeholder()
+IS_PG = db_conn.use_postgresql
+
+NOTIFICATION_BIGINT_MIGRATION = 'notif_bigint_v1'
+
+# Type names that already satisfy the BIGINT user_id requirement
+BIGINT_ALIASES = frozenset({'bigint', 'int8'})
+
+# Cleared while startup migrations run in the background; handlers that write
+# to notification tables wait on it via wait_for_startup_migrations()
+MIGRATIONS_READY = threading.Event()
+MIGRATIONS_READY.set()
+
+# notification_history tables larger than this are migrated through a shadow table
+ONLINE_MIGRATION_ROW_THRESHOLD = 100000
+ONLINE_MIGRATION_BATCH_SIZE = 10000
+
+# How long a startup ALTER may wait for its table lock before giving up
+MIGRATION_LOCK_TIMEOUT = '2s'
+
+@contextmanager
+def savepoint(cursor, name):
+    """
+    Run a block inside a SAVEPOINT. On error only the block is rolled back,
+    so the surrounding transaction stays usable; the error is re-raised.
+    """
+    cursor.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except Exception:
+        cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        raise
+    else:
+        cursor.execute(f"RELEASE SAVEPOINT {name}")
+
+def get_user_id_sequences(cursor, table_name):
+    """Return the sequences owned by table_name.user_id (created by SERIAL)"""
+    cursor.execute("""
+        SELECT s.oid::regclass::text
+        FROM pg_depend d
+        JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+        JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+        WHERE d.classid = 'pg_class'::regclass
+        AND d.refclassid = 'pg_class'::regclass
+        AND d.refobjid = to_regclass(%s)
+        AND a.attname = 'user_id'
+    """, (table_name,))
+    return [row[0] for row in cursor.fetchall()]
+
+def _load_user_id_types(cursor, tables):
+    """
+    Fetch the user_id column type of several tables in one round-trip.
+    Returns {table_name: (data_type, column_default)} for every table that
+    exists; data_type is None when the table has no user_id column.
+    data_type is the column's own regtype, so a domain over bigint is
+    reported by the domain name rather than as bigint.
+    """
+    cursor.execute("""
+        SELECT c.relname, a.atttypid::regtype::text, pg_get_expr(d.adbin, d.adrelid)
+        FROM pg_class c
+        LEFT JOIN pg_attribute a
+            ON a.attrelid = c.oid AND a.attname = 'user_id' AND NOT a.attisdropped
+        LEFT JOIN pg_attrdef d
+            ON d.adrelid = c.oid AND d.adnum = a.attnum
+        WHERE c.relname = ANY(%s) AND c.relkind = 'r' AND pg_table_is_visible(c.oid)
+    """, (list(tables),))
+    return {table_name: (data_type, column_default)
+            for table_name, data_type, column_default in cursor.fetchall()}
+
+def _migrate_notification_history_online(conn, cursor):
+    """
+    Convert notification_history.user_id to BIGINT without holding an exclusive
+    lock for the whole table rewrite: copy rows into a shadow table in batches
+    while a trigger mirrors concurrent writes, then swap the tables in one short
+    transaction.
+    """
+    logger.info("Large notification_history table - using online migration...")
+    
+    # Clean up leftovers from an interrupted earlier run
+    cursor.execute("""
+        DROP TRIGGER IF EXISTS notification_history_sync ON notification_history;
+        DROP TABLE IF EXISTS notification_history_new;
+    """)
+    
+    # Shadow table with the target schema (foreign keys are re-added at swap time)
+    cursor.execute("""
+        CREATE TABLE notification_history_new (LIKE notification_history INCLUDING ALL);
+        ALTER TABLE notification_history_new ALTER COLUMN user_id TYPE BIGINT;
+    """)
+    
+    # Every column of the table, for the trigger's ON CONFLICT update list
+    cursor.execute("""
+        SELECT quote_ident(attname) FROM pg_attribute
+        WHERE attrelid = 'notification_history'::regclass AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """)
+    update_columns = ", ".join(f"{column} = EXCLUDED.{column}" for (column,) in cursor.fetchall())
+    
+    # Mirror writes made while the backfill runs. A backfill batch may hold an
+    # uncommitted copy of the same id that the DELETE can't see, so the INSERT
+    # upserts instead of failing the application's write with a unique violation
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION notification_history_sync() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM notification_history_new WHERE id = OLD.id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO notification_history_new SELECT NEW.*
+                ON CONFLICT (id) DO UPDATE SET {update_columns};
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        
+        CREATE TRIGGER notification_history_sync
+        AFTER INSERT OR UPDATE OR DELETE ON notification_history
+        FOR EACH ROW EXECUTE FUNCTION notification_history_sync();
+    """)
+    conn.commit()
+    
+    # The trigger keeps the shadow table in step with concurrent writes, so
+    # handlers don't have to wait for the backfill
+    MIGRATIONS_READY.set()
+    
+    try:
+        # Backfill existing rows in id order, committing each batch to keep locks short
+        last_id = 0
+        copied = 0
+        while True:
+            cursor.execute("""
+                WITH batch AS (
+                    SELECT * FROM notification_history
+                    WHERE id > %s ORDER BY id LIMIT %s
+                ), ins AS (
+                    INSERT INTO notification_history_new SELECT * FROM batch
+                    ON CONFLICT (id) DO NOTHING
+                )
+                SELECT max(id), count(*) FROM batch
+            """, (last_id, ONLINE_MIGRATION_BATCH_SIZE))
+            batch_max_id, batch_count = cursor.fetchone()
+            conn.commit()
+        
+            if batch_max_id is None:
+                break
+            last_id = batch_max_id
+            copied += batch_count
+            logger.debug(f"Copied {copied} notification_history rows")
+        
+        # Swap the tables in a single short transaction
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = 'notification_history'::regclass AND contype = 'f'
+        """)
+        foreign_keys = cursor.fetchall()
+        
+        cursor.execute("""
+            LOCK TABLE notification_history IN ACCESS EXCLUSIVE MODE;
+            -- A batch may have copied a row whose delete it couldn't see yet
+            DELETE FROM notification_history_new n
+            WHERE NOT EXISTS (SELECT 1 FROM notification_history o WHERE o.id = n.id);
+            DROP TRIGGER notification_history_sync ON notification_history;
+            DROP FUNCTION notification_history_sync();
+            ALTER TABLE notification_history RENAME TO notification_history_old;
+            ALTER TABLE notification_history_new RENAME TO notification_history;
+            ALTER SEQUENCE IF EXISTS notification_history_id_seq OWNED BY notification_history.id;
+        """)
+        for constraint_name, definition in foreign_keys:
+            # NOT VALID skips the full-table check while the lock is held
+            cursor.execute(
+                f"ALTER TABLE notification_history ADD CONSTRAINT {constraint_name} {definition} NOT VALID"
+            )
+        cursor.execute("DROP TABLE notification_history_old")
+        conn.commit()
+        
+    except Exception:
+        # Don't leave the trigger double-writing into a shadow table that no
+        # longer has a migration behind it
+        conn.rollback()
+        cursor.execute("""
+            DROP TRIGGER IF EXISTS notification_history_sync ON notification_history;
+            DROP FUNCTION IF EXISTS notification_history_sync();
+            DROP TABLE IF EXISTS notification_history_new;
+        """)
+        conn.commit()
+        raise
+    
+    # Validate foreign keys without blocking writes
+    for constraint_name, _definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE notification_history VALIDATE CONSTRAINT {constraint_name}")
+    conn.commit()
+    
+    logger.info(f"Online migration copied {copied} notification_history rows")
+
+def auto_migrate_notification_tables(conn=None):
     """
     Automatically migrate notification table schemas at startup.
     This runs safely and preserves existing data.
+    Uses the given connection if provided, otherwise borrows one from the pool.
     """
-    db_conn = get_db_connection()
-    
-    if not db_conn.use_postgresql:
+    if not IS_PG:
         logger.debug("Not using PostgreSQL - no migration needed")
         return True
     
     logger.info("🔧 Running automatic notification table migration...")
     
+    shared_conn = conn
     try:
-        with db_conn.get_connection() as conn:
+        with nullcontext(conn) if conn is not None else db_conn.get_connection() as conn:
             cursor = conn.cursor()
             
+            if is_migration_applied(cursor, NOTIFICATION_BIGINT_MIGRATION):
+                logger.info("✅ Notification tables already migrated - skipping schema checks")
+                return True
+            
             # Check if migration is needed by inspecting column types
-            migration_needed = False
             tables_to_check = ['notification_preferences', 'notification_history', 'post_subscriptions']
+            user_id_types = _load_user_id_types(cursor, tables_to_check)
             
+            migration_needed = False
             for table_name in tables_to_check:
-                try:
-                    # Check if table exists and get user_id column type
-                    cursor.execute(f"""
-                        SELECT data_type, column_default
-                        FROM information_schema.columns
-                        WHERE table_name = '{table_name}' AND column_name = 'user_id'
-                    """)
-                    result = cursor.fetchone()
-                    
-                    if result:
-                        data_type, column_default = result
-                        logger.debug(f"Table {table_name}: user_id is {data_type}")
-                        
-                        # Check if user_id is not BIGINT
-                        if data_type.lower() not in ['bigint', 'int8']:
-                            logger.info(f"Migration needed: {table_name}.user_id is {data_type}, should be BIGINT")
-                            migration_needed = True
-                            break
-                            
-                except Exception as e:
-                    logger.debug(f"Could not check {table_name}: {e}")
+                data_type = user_id_types.get(table_name, (None, None))[0]
+                if data_type is None:
                     continue
+                
+                logger.debug(f"Table {table_name}: user_id is {data_type}")
+                
+                # Check if user_id is not BIGINT
+                if data_type.lower() not in BIGINT_ALIASES:
+                    logger.info(f"Migration needed: {table_name}.user_id is {data_type}, should be BIGINT")
+                    migration_needed = True
+                    break
             
             if not migration_needed:
                 logger.info("✅ Notification tables already have correct schema - no migration needed")
+                # Only remember the result once every table exists with the right type
+                if all(table_name in user_id_types for table_name in tables_to_check):
+                    mark_migration_applied(cursor, NOTIFICATION_BIGINT_MIGRATION,
+                                           'Notification tables user_id -> BIGINT')
+                    conn.commit()
                 return True
             
             logger.info("🚀 Starting automatic schema migration...")
             
+            # Each table is migrated inside its own savepoint and committed on its
+            # own, so a failing ALTER only undoes that table and the exclusive lock
+            # is released as soon as the table is done. lock_timeout stops an ALTER
+            # from queueing behind long readers, which would stall every later
+            # query on the table; the table is then retried at the next startup
+            
             # Migrate notification_preferences
             try:
-                cursor.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_name = 'notification_preferences'
-                    )
-                """)
-                if cursor.fetchone()[0]:
+                if 'notification_preferences' in user_id_types:
                     logger.info("Migrating notification_preferences table...")
                     
-                    # Check current user_id type
-                    cursor.execute("""
-                        SELECT data_type, column_default
-                        FROM information_schema.columns
-                        WHERE table_name = 'notification_preferences' AND column_name = 'user_id'
-                    """)
-                    result = cursor.fetchone()
+                    data_type = user_id_types['notification_preferences'][0]
                     
-                    if result and result[0].lower() not in ['bigint', 'int8']:
-                        # Alter column type and remove SERIAL default if present
-                        cursor.execute("""
-                            ALTER TABLE notification_preferences
-                            ALTER COLUMN user_id TYPE BIGINT USING user_id::bigint,
-                            ALTER COLUMN user_id DROP DEFAULT;
-                        """)
-                        
-                        # Drop the sequence if it exists (SERIAL creates one)
-                        try:
-                            cursor.execute("DROP SEQUENCE IF EXISTS notification_preferences_user_id_seq CASCADE;")
-                        except Exception:
-                            pass  # Sequence might not exist
-                        
-                        # Fix boolean defaults
-                        cursor.execute("""
-                            ALTER TABLE notification_preferences
-                            ALTER COLUMN comment_notifications SET DEFAULT TRUE,
-                            ALTER COLUMN daily_digest SET DEFAULT TRUE,
-                            ALTER COLUMN trending_alerts SET DEFAULT TRUE;
-                        """)
+                    if data_type and data_type.lower() not in BIGINT_ALIASES:
+                        with savepoint(cursor, 'sp_notif_pref'):
+                            cursor.execute(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'")
+                            # Alter column type, remove SERIAL default if present and
+                            # fix boolean defaults in a single ALTER TABLE
+                            cursor.execute("""
+                                ALTER TABLE notification_preferences
+                                ALTER COLUMN user_id TYPE BIGINT USING user_id::bigint,
+                                ALTER COLUMN user_id DROP DEFAULT,
+                                ALTER COLUMN comment_notifications SET DEFAULT TRUE,
+                                ALTER COLUMN daily_digest SET DEFAULT TRUE,
+                                ALTER COLUMN trending_alerts SET DEFAULT TRUE;
+                            """)
+                            
+                            # Drop the sequence SERIAL created, if the column still owns one
+                            for sequence_name in get_user_id_sequences(cursor, 'notification_preferences'):
+                                cursor.execute(f"DROP SEQUENCE IF EXISTS {sequence_name};")
+                        conn.commit()
                         
                         logger.info("✅ Fixed notification_preferences.user_id -> BIGINT")
                         
             except Exception as e:
                 logger.warning(f"Could not migrate notification_preferences: {e}")
             
-            # Migrate notification_history
+            # Migrate post_subscriptions before notification_history: the online
+            # history migration opens the handler gate once its trigger is in place
             try:
-                cursor.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_name = 'notification_history'
-                    )
-                """)
-                if cursor.fetchone()[0]:
-                    logger.info("Migrating notification_history table...")
+                if 'post_subscriptions' in user_id_types:
+                    logger.info("Migrating post_subscriptions table...")
                     
-                    cursor.execute("""
-                        SELECT data_type
-                        FROM information_schema.columns
-                        WHERE table_name = 'notification_history' AND column_name = 'user_id'
-                    """)
-                    result = cursor.fetchone()
+                    data_type = user_id_types['post_subscriptions'][0]
                     
-                    if result and result[0].lower() not in ['bigint', 'int8']:
-                        cursor.execute("""
-                            ALTER TABLE notification_history
-                            ALTER COLUMN user_id TYPE BIGINT USING user_id::bigint;
-                        """)
-                        logger.info("✅ Fixed notification_history.user_id -> BIGINT")
+                    if data_type and data_type.lower() not in BIGINT_ALIASES:
+                        with savepoint(cursor, 'sp_post_subs'):
+                            cursor.execute(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'")
+                            cursor.execute("""
+                                ALTER TABLE post_subscriptions
+                                ALTER COLUMN user_id TYPE BIGINT USING user_id::bigint;
+                            """)
+                        conn.commit()
+                        logger.info("✅ Fixed post_subscriptions.user_id -> BIGINT")
                         
             except Exception as e:
-                logger.warning(f"Could not migrate notification_history: {e}")
+                logger.warning(f"Could not migrate post_subscriptions: {e}")
             
-            # Migrate post_subscriptions
+            # Migrate notification_history
             try:
-                cursor.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_name = 'post_subscriptions'
-                    )
-                """)
-                if cursor.fetchone()[0]:
-                    logger.info("Migrating post_subscriptions table...")
+                if 'notification_history' in user_id_types:
+                    logger.info("Migrating notification_history table...")
                     
-                    cursor.execute("""
-                        SELECT data_type
-                        FROM information_schema.columns
-                        WHERE table_name = 'post_subscriptions' AND column_name = 'user_id'
-                    """)
-                    result = cursor.fetchone()
+                    data_type = user_id_types['notification_history'][0]
                     
-                    if result and result[0].lower() not in ['bigint', 'int8']:
-                        cursor.execute("""
-                            ALTER TABLE post_subscriptions
-                            ALTER COLUMN user_id TYPE BIGINT USING user_id::bigint;
-                        """)
-                        logger.info("✅ Fixed post_subscriptions.user_id -> BIGINT")
+                    if data_type and data_type.lower() not in BIGINT_ALIASES:
+                        cursor.execute(
+                            "SELECT reltuples FROM pg_class WHERE oid = to_regclass('notification_history')"
+                        )
+                        estimated_rows = cursor.fetchone()[0]
+                        
+                        if estimated_rows > ONLINE_MIGRATION_ROW_THRESHOLD:
+                            # Too large to rewrite under an exclusive lock - switch to the
+                            # batched shadow-table migration, which manages its own transactions
+                            conn.commit()
+                            try:
+                                _migrate_notification_history_online(conn, cursor)
+                            except Exception:
+                                conn.rollback()
+                                raise
+                        else:
+                            with savepoint(cursor, 'sp_notif_history'):
+                                cursor.execute(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'")
+                                cursor.execute("""
+                                    ALTER TABLE notification_history
+                                    ALTER COLUMN user_id TYPE BIGINT USING user_id::bigint;
+                                """)
+                            conn.commit()
+                        logger.info("✅ Fixed notification_history.user_id -> BIGINT")
                         
             except Exception as e:
-                logger.warning(f"Could not migrate post_subscriptions: {e}")
+                logger.warning(f"Could not migrate notification_history: {e}")
             
-            # Commit all changes
-            conn.commit()
+            # The per-table failures above are only logged, so re-read the column
+            # types and keep the marker unwritten until every table is BIGINT
+            user_id_types = _load_user_id_types(cursor, tables_to_check)
+            unmigrated = [table_name for table_name in tables_to_check
+                          if table_name not in user_id_types
+                          or (user_id_types[table_name][0] or '').lower() not in BIGINT_ALIASES]
+            if unmigrated:
+                logger.error(f"❌ user_id is still not BIGINT in: {', '.join(unmigrated)}")
+                # Keep the tables that did migrate; the rest is retried next startup
+                conn.commit()
+                return False
             
-            # Test the migration with a large user ID
+            # Test the migration with a user ID beyond the INTEGER range
             logger.info("🧪 Testing migration with large Telegram user ID...")
-            test_user_id = 1298849354
-            placeholder = db_conn.get_placeholder()
+            test_user_id = 5000000000
             
+            # The test rows live in a savepoint that is always rolled back, so they
+            # never persist and a failing test can't discard the DDL above. A
+            # throwaway users row satisfies notification_preferences' foreign key.
+            test_passed = False
+            cursor.execute("SAVEPOINT sp_migration_test")
             try:
-                # Test insertion (this should not fail anymore)
-                cursor.execute(f"""
-                    INSERT INTO notification_preferences (user_id, comment_notifications) 
-                    VALUES ({placeholder}, TRUE) 
-                    ON CONFLICT (user_id) DO UPDATE SET comment_notifications = TRUE
-                """, (test_user_id,))
-                
                 cursor.execute(f"""
+                    INSERT INTO users (user_id) VALUES ({PLACEHOLDER})
+                    ON CONFLICT (user_id) DO NOTHING;
+                    
+                    WITH ins_pref AS (
+                        INSERT INTO notification_preferences (user_id, comment_notifications) 
+                        VALUES ({PLACEHOLDER}, TRUE) 
+                        ON CONFLICT (user_id) DO UPDATE SET comment_notifications = TRUE
+                        RETURNING user_id
+                    )
                     INSERT INTO notification_history 
                     (user_id, notification_type, title, content) 
-                    VALUES ({placeholder}, 'migration_test', 'Migration Test', 'Auto-migration successful')
-                """, (test_user_id,))
-                
-                conn.commit()
+                    SELECT user_id, 'migration_test', 'Migration Test', 'Auto-migration successful'
+                    FROM ins_pref;
+                """, (test_user_id, test_user_id))
+                test_passed = True
                 logger.info("✅ Migration test successful - large user IDs now work!")
-                
-                # Clean up test data
-                cursor.execute(f"DELETE FROM notification_history WHERE notification_type = 'migration_test'")
-                conn.commit()
-                
             except Exception as test_e:
                 logger.error(f"❌ Migration test failed: {test_e}")
+            finally:
+                cursor.execute("ROLLBACK TO SAVEPOINT sp_migration_test")
+            
+            if test_passed:
+                mark_migration_applied(cursor, NOTIFICATION_BIGINT_MIGRATION,
+                                       'Notification tables user_id -> BIGINT')
+            
+            # Commit the marker only if the test passed
+            conn.commit()
+            if not test_passed:
                 return False
             
             logger.info("🎉 Automatic notification table migration completed successfully!")
@@ -200,90 +411,74 @@ def auto_migrate_notification_tables():
             
     except Exception as e:
         logger.error(f"❌ Auto-migration failed: {e}")
+        if shared_conn is not None:
+            shared_conn.rollback()
         return False
 
-def fix_emoji_encoding():
-    """
-    Fix emoji encoding issues in PostgreSQL database on Render.
-    Updates rank emojis to ensure proper Unicode handling.
-    """
-    db_conn = get_db_connection()
-    
-    if not db_conn.use_postgresql:
-        logger.debug("Not using PostgreSQL - emoji fix not needed")
-        return True
-    
-    logger.info("🔧 Fixing emoji encoding in database...")
-    
+def _do_migrations():
+    """Run every startup migration on one shared connection"""
     try:
-        # Define rank emojis
-        rank_data = [
-            (1, 'Freshman', '🥉'),
-            (2, 'Sophomore', '🥈'),
-            (3, 'Junior', '🥇'),
-            (4, 'Senior', '🏆'),
-            (5, 'Graduate', '🎓'),
-            (6, 'Master', '👑'),
-            (7, 'Legend', '🌟')
-        ]
-        
+        # Share one connection between all startup migrations; each migration
+        # still commits or rolls back as its own transaction
         with db_conn.get_connection() as conn:
-            cursor = conn.cursor()
-            placeholder = db_conn.get_placeholder()
-            
-            # Update each rank with proper emoji
-            for rank_id, rank_name, emoji in rank_data:
-                try:
-                    cursor.execute(f"""
-                        UPDATE rank_definitions 
-                        SET rank_emoji = {placeholder}
-                        WHERE rank_id = {placeholder}
-                    """, (emoji, rank_id))
-                    
-                    logger.debug(f"Updated {rank_name}: {emoji}")
-                    
-                except Exception as e:
-                    logger.warning(f"Could not update {rank_name} emoji: {e}")
-                    continue
-            
-            conn.commit()
-            
-            # Test one emoji retrieval
-            cursor.execute("SELECT rank_emoji FROM rank_definitions WHERE rank_id = 1")
-            result = cursor.fetchone()
-            if result:
-                test_emoji = result[0]
-                logger.info(f"✅ Emoji encoding test successful: {test_emoji}")
-            
-            return True
+            # Run notification table migration
+            if not auto_migrate_notification_tables(conn):
+                logger.error("Notification table migration failed")
+                return False
             
+            # Fix emoji encoding issues (especially for Render PostgreSQL)
+            if not fix_emoji_encoding(conn):
+                logger.warning("Emoji encoding fix failed - continuing anyway")
+                # Don't fail startup for emoji issues
+        
+        logger.info("✅ All startup migrations completed successfully")
+        return True
+        
     except Exception as e:
-        logger.error(f"❌ Failed to fix emoji encoding: {e}")
+        logger.error(f"Startup migrations failed: {e}")
         return False
+    finally:
+        MIGRATIONS_READY.set()
 
 def run_startup_migrations():
     """
     Run all startup migrations. Called by the main bot initialization.
+    Returns immediately when every migration is already recorded; otherwise
+    the migrations run in a background thread so the bot can start polling.
     """
     logger.info("Running startup database migrations...")
     
-    try:
-        # Run notification table migration
-        if not auto_migrate_notification_tables():
-            logger.error("Notification table migration failed")
-            return False
-        
-        # Fix emoji encoding issues (especially for Render PostgreSQL)
-        if not fix_emoji_encoding():
-            logger.warning("Emoji encoding fix failed - continuing anyway")
-            # Don't fail startup for emoji issues
-        
-        logger.info("✅ All startup migrations completed successfully")
+    if not IS_PG:
+        logger.debug("Not using PostgreSQL - no startup migrations needed")
         return True
-        
+    
+    try:
+        with db_conn.get_connection() as conn:
+            cursor = conn.cursor()
+            if (is_migration_applied(cursor, NOTIFICATION_BIGINT_MIGRATION)
+                    and is_migration_applied(cursor, RANK_EMOJIS_MIGRATION)):
+                logger.info("✅ Startup migrations already applied")
+                return True
     except Exception as e:
-        logger.error(f"Startup migrations failed: {e}")
+        logger.error(f"Could not check startup migrations: {e}")
         return False
+    
+    MIGRATIONS_READY.clear()
+    thread = threading.Thread(target=_do_migrations, name="startup-migrations", daemon=True)
+    thread.start()
+    logger.info("Startup migrations running in background")
+    return True
+
+def wait_for_startup_migrations(timeout=5):
+    """
+    Wait for background startup migrations before touching notification tables.
+    Returns False if they are still running after timeout seconds; timeout=0
+    only checks, for synchronous code running on the event loop.
+    """
+    ready = MIGRATIONS_READY.wait(timeout)
+    if not ready:
+        logger.warning("Startup migrations still running - try again later")
+    return ready
 
 if __name__ == "__main__":
     # For testing the migration directly
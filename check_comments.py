@@ -1,6 +1,8 @@
 import sqlite3
 
 conn = sqlite3.connect('confessions.db')
+# Read-only session with a larger page cache and memory-mapped I/O
+conn.executescript("PRAGMA query_only=1; PRAGMA cache_size=-64000; PRAGMA mmap_size=268435456;")
 cursor = conn.cursor()
 
 # Check if comments table exists
@@ -10,7 +12,7 @@ print('Comments table exists:', cursor.fetchone() is not None)
 # Check comments table structure
 cursor.execute('PRAGMA table_info(comments)')
 print('Comments table structure:')
-for row in cursor.fetchall():
+for row in cursor:
     print(row)
 
 # Count total comments
@@ -20,13 +22,13 @@ print('Total comments:', cursor.fetchone()[0])
 # Show recent comments if any
 cursor.execute('SELECT comment_id, post_id, content, user_id, timestamp FROM comments ORDER BY comment_id DESC LIMIT 5')
 print('Recent comments:')
-for row in cursor.fetchall():
+for row in cursor:
     print(row)
 
 # Check recent posts
-cursor.execute('SELECT post_id, content, approved FROM posts ORDER BY post_id DESC LIMIT 3')
+cursor.execute("SELECT post_id, substr(content, 1, 50) || '...', approved FROM posts ORDER BY post_id DESC LIMIT 3")
 print('\nRecent posts:')
-for row in cursor.fetchall():
-    print(f"Post {row[0]}: {row[1][:50]}... (approved: {row[2]})")
+for row in cursor:
+    print(f"Post {row[0]}: {row[1]} (approved: {row[2]})")
 
 conn.close()
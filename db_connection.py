@@ -7,7 +7,7 @@ from contextlib import contextmanager
 try:
     import psycopg2
     import psycopg2.extras
-    from psycopg2.pool import SimpleConnectionPool
+    from psycopg2.pool import ThreadedConnectionPool
     PSYCOPG2_AVAILABLE = True
 except ImportError:
     PSYCOPG2_AVAILABLE = False
@@ -47,8 +47,9 @@ class DatabaseConnection:
                 # Build connection string from individual components
                 connection_string = f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DATABASE}"
             
-            # Create connection pool
-            self.connection_pool = SimpleConnectionPool(
+            # Create connection pool; thread-safe because startup migrations and
+            # asyncio.to_thread workers take connections alongside the handlers
+            self.connection_pool = ThreadedConnectionPool(
                 minconn=1,
                 maxconn=20,
                 dsn=connection_string
@@ -5,52 +5,85 @@ This script updates rank emojis to ensure proper Unicode handling on Render
 """
 
 import logging
+from contextlib import nullcontext
 from db_connection import get_db_connection
+from migration import is_migration_applied, mark_migration_applied
 
 logger = logging.getLogger(__name__)
 
-def fix_rank_emojis():
-    """Fix emoji encoding in rank_definitions table"""
-    
-    # Define rank emojis with explicit Unicode escape sequences as backup
-    rank_data = [
-        (1, 'Freshman', '🥉', 0, 99),
-        (2, 'Sophomore', '🥈', 100, 249),
-        (3, 'Junior', '🥇', 250, 499),
-        (4, 'Senior', '🏆', 500, 999),
-        (5, 'Graduate', '🎓', 1000, 1999),
-        (6, 'Master', '👑', 2000, 4999),
-        (7, 'Legend', '🌟', 5000, None)
-    ]
-    
-    db_conn = get_db_connection()
+# Backend is chosen when db_connection is imported
+db_conn = get_db_connection()
+PLACEHOLDER = db_conn.get_placeholder()
+IS_PG = db_conn.use_postgresql
+
+RANK_EMOJIS_MIGRATION = 'rank_emojis_v1'
+
+# Rank emojis as (rank_id, rank_name, emoji, min_points, max_points)
+RANK_EMOJIS = (
+    (1, 'Freshman', '🥉', 0, 99),
+    (2, 'Sophomore', '🥈', 100, 249),
+    (3, 'Junior', '🥇', 250, 499),
+    (4, 'Senior', '🏆', 500, 999),
+    (5, 'Graduate', '🎓', 1000, 1999),
+    (6, 'Master', '👑', 2000, 4999),
+    (7, 'Legend', '🌟', 5000, None),
+)
+EXPECTED_EMOJIS = {rank_id: emoji for rank_id, _rank_name, emoji, *_ in RANK_EMOJIS}
+
+def fix_rank_emojis(conn=None, force=False) -> bool:
+    """
+    Fix emoji encoding in rank_definitions table.
+    Also run at bot startup via auto_migrate_notifications.fix_emoji_encoding,
+    which passes in its shared connection. force=True re-checks the emojis
+    even when the fix is already recorded, for manual runs of this script.
+    """
     
-    if not db_conn.use_postgresql:
+    if not IS_PG:
         logger.info("Not using PostgreSQL - emoji fix not needed")
         return True
     
     logger.info("🔧 Fixing emoji encoding in rank_definitions table...")
     
+    shared_conn = conn
     try:
-        with db_conn.get_connection() as conn:
+        with nullcontext(conn) if conn is not None else db_conn.get_connection() as conn:
             cursor = conn.cursor()
-            placeholder = db_conn.get_placeholder()
             
-            # Update each rank with proper emoji
-            for rank_id, rank_name, emoji, min_points, max_points in rank_data:
-                try:
-                    cursor.execute(f"""
-                        UPDATE rank_definitions 
-                        SET rank_emoji = {placeholder}
-                        WHERE rank_id = {placeholder}
-                    """, (emoji, rank_id))
-                    
-                    logger.info(f"✅ Updated {rank_name}: {emoji}")
-                    
-                except Exception as e:
-                    logger.error(f"❌ Failed to update {rank_name}: {e}")
-                    continue
+            if not force and is_migration_applied(cursor, RANK_EMOJIS_MIGRATION):
+                logger.info("✅ Rank emojis already fixed - nothing to do")
+                return True
+            
+            # Only touch ranks whose emoji is actually wrong
+            cursor.execute(
+                f"SELECT rank_id, rank_emoji FROM rank_definitions WHERE rank_id = ANY({PLACEHOLDER})",
+                (list(EXPECTED_EMOJIS),)
+            )
+            current = dict(cursor.fetchall())
+            diff = [(rank_id, emoji) for rank_id, emoji in EXPECTED_EMOJIS.items()
+                    if rank_id in current and current[rank_id] != emoji]
+            
+            if not diff:
+                logger.info("✅ Rank emojis are current - no update needed")
+                # Don't record the fix until every rank has been seeded
+                if len(current) == len(EXPECTED_EMOJIS):
+                    mark_migration_applied(cursor, RANK_EMOJIS_MIGRATION, 'Rank emoji encoding fix')
+                    conn.commit()
+                return True
+            
+            # Update the outdated ranks in a single statement
+            values_sql = ", ".join([f"({PLACEHOLDER}, {PLACEHOLDER})"] * len(diff))
+            params = [item for rank_id, emoji in diff for item in (rank_id, emoji)]
+            cursor.execute(f"""
+                UPDATE rank_definitions 
+                SET rank_emoji = v.emoji
+                FROM (VALUES {values_sql}) AS v(rank_id, emoji)
+                WHERE rank_definitions.rank_id = v.rank_id
+            """, params)
+            logger.info(f"✅ Updated {cursor.rowcount} rank emojis")
             
+            # Same rule as above: ranks seeded later must still be checked
+            if len(current) == len(EXPECTED_EMOJIS):
+                mark_migration_applied(cursor, RANK_EMOJIS_MIGRATION, 'Rank emoji encoding fix')
             conn.commit()
             
             # Test retrieval
@@ -59,18 +92,20 @@ def fix_rank_emojis():
             results = cursor.fetchall()
             
             for rank_name, emoji in results:
-                logger.info(f"Retrieved: {rank_name} -> {repr(emoji)} -> {emoji}")
+                logger.debug(f"Retrieved: {rank_name} -> {repr(emoji)} -> {emoji}")
             
             logger.info("🎉 Emoji encoding fix completed successfully!")
             return True
             
     except Exception as e:
         logger.error(f"❌ Failed to fix emoji encoding: {e}")
+        if shared_conn is not None:
+            shared_conn.rollback()
         return False
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    success = fix_rank_emojis()
+    success = fix_rank_emojis(force=True)
     if success:
         print("✅ Emoji encoding fixed!")
     else:
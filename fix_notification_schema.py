@@ -6,15 +6,18 @@ Fixes user_id column type and boolean column type mismatch errors in notificatio
 
 import logging
 from db_connection import get_db_connection
+from auto_migrate_notifications import BIGINT_ALIASES, get_user_id_sequences, savepoint
 
 logger = logging.getLogger(__name__)
 
+db_conn = get_db_connection()
+PLACEHOLDER = db_conn.get_placeholder()
+IS_PG = db_conn.use_postgresql
+
 def fix_notification_schema():
     """Fix PostgreSQL user_id and boolean column schema issues"""
     try:
-        db_conn = get_db_connection()
-        
-        if not db_conn.use_postgresql:
+        if not IS_PG:
             print("✅ Not using PostgreSQL - no schema fix needed")
             return True
             
@@ -26,16 +29,21 @@ def fix_notification_schema():
             # Check which tables exist and need fixing
             tables_to_check = ['notification_preferences', 'notification_history', 'post_subscriptions', 'trending_cache']
             
+            # Fetch existence and user_id type of every table in one query
+            cursor.execute("""
+                SELECT t.table_name, c.oid IS NOT NULL, a.atttypid::regtype::text
+                FROM unnest(%s::text[]) AS t(table_name)
+                LEFT JOIN pg_class c ON c.oid = to_regclass(t.table_name)
+                LEFT JOIN pg_attribute a
+                    ON a.attrelid = c.oid AND a.attname = 'user_id' AND NOT a.attisdropped;
+            """, (tables_to_check,))
+            table_info = {table_name: (table_exists, data_type)
+                          for table_name, table_exists, data_type in cursor.fetchall()}
+            
             for table_name in tables_to_check:
                 print(f"\n📋 Checking {table_name} table...")
                 
-                cursor.execute(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_name = '{table_name}'
-                    );
-                """)
-                table_exists = cursor.fetchone()[0]
+                table_exists, data_type = table_info[table_name]
                 
                 if not table_exists:
                     print(f"✅ {table_name} table doesn't exist yet - will be created with correct schema")
@@ -43,85 +51,44 @@ def fix_notification_schema():
                     
                 # Check user_id column type (except trending_cache which doesn't have user_id)
                 if table_name != 'trending_cache':
-                    cursor.execute(f"""
-                        SELECT data_type, character_maximum_length, numeric_precision
-                        FROM information_schema.columns
-                        WHERE table_name = '{table_name}' AND column_name = 'user_id';
-                    """)
-                    user_id_info = cursor.fetchone()
-                    
-                    if user_id_info:
-                        data_type, max_len, precision = user_id_info
+                    if data_type:
                         print(f"  user_id column: {data_type}")
                         
-                        # If user_id is not BIGINT, we need to recreate the table
-                        if data_type.lower() not in ['bigint', 'int8']:
-                            print(f"  ❌ user_id is {data_type}, should be BIGINT - recreating table...")
+                        # If user_id is not BIGINT, convert it in place (keeps existing rows)
+                        if data_type.lower() not in BIGINT_ALIASES:
+                            print(f"  ❌ user_id is {data_type}, should be BIGINT - converting column...")
                             
-                            # Recreate the table with correct schema
-                            if table_name == 'notification_preferences':
-                                cursor.execute('DROP TABLE IF EXISTS notification_preferences CASCADE')
-                                cursor.execute('''
-                                    CREATE TABLE notification_preferences (
-                                        user_id BIGINT PRIMARY KEY,
-                                        comment_notifications BOOLEAN DEFAULT TRUE,
-                                        favorite_categories TEXT DEFAULT '',
-                                        daily_digest BOOLEAN DEFAULT TRUE,
-                                        trending_alerts BOOLEAN DEFAULT TRUE,
-                                        digest_time TEXT DEFAULT '18:00',
-                                        notification_frequency TEXT DEFAULT 'immediate',
-                                        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                        FOREIGN KEY (user_id) REFERENCES users (user_id)
-                                    )
-                                ''')
-                                print(f"  ✅ Recreated {table_name} with BIGINT user_id")
-                                
-                            elif table_name == 'notification_history':
-                                cursor.execute('DROP TABLE IF EXISTS notification_history CASCADE')
-                                cursor.execute('''
-                                    CREATE TABLE notification_history (
-                                        id SERIAL PRIMARY KEY,
-                                        user_id BIGINT,
-                                        notification_type TEXT NOT NULL,
-                                        title TEXT NOT NULL,
-                                        content TEXT NOT NULL,
-                                        related_post_id INTEGER,
-                                        related_comment_id INTEGER,
-                                        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                        delivered BOOLEAN DEFAULT FALSE,
-                                        clicked BOOLEAN DEFAULT FALSE,
-                                        FOREIGN KEY (user_id) REFERENCES users (user_id)
-                                    )
-                                ''')
-                                print(f"  ✅ Recreated {table_name} with BIGINT user_id")
+                            try:
+                                # Savepoint keeps one failing table from losing the others
+                                with savepoint(cursor, 'sp_user_id'):
+                                    # Alter the column type and remove any SERIAL default in one statement
+                                    cursor.execute(f"""
+                                        ALTER TABLE {table_name}
+                                        ALTER COLUMN user_id TYPE BIGINT USING user_id::bigint,
+                                        ALTER COLUMN user_id DROP DEFAULT;
+                                    """)
+                                    
+                                    # Drop the sequence a SERIAL user_id would have created
+                                    for sequence_name in get_user_id_sequences(cursor, table_name):
+                                        cursor.execute(f"DROP SEQUENCE IF EXISTS {sequence_name};")
                                 
-                            elif table_name == 'post_subscriptions':
-                                cursor.execute('DROP TABLE IF EXISTS post_subscriptions CASCADE')
-                                cursor.execute('''
-                                    CREATE TABLE post_subscriptions (
-                                        id SERIAL PRIMARY KEY,
-                                        user_id BIGINT,
-                                        post_id INTEGER,
-                                        subscribed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                        active BOOLEAN DEFAULT TRUE,
-                                        FOREIGN KEY (user_id) REFERENCES users (user_id),
-                                        FOREIGN KEY (post_id) REFERENCES posts (post_id),
-                                        UNIQUE(user_id, post_id)
-                                    )
-                                ''')
-                                print(f"  ✅ Recreated {table_name} with BIGINT user_id")
+                                print(f"  ✅ Converted {table_name}.user_id to BIGINT")
                                 
-                            continue  # Skip to next table since we recreated this one
+                            except Exception as e:
+                                print(f"  ⚠️  Error converting {table_name}.user_id: {e}")
                         else:
                             print(f"  ✅ user_id column is already BIGINT")
                     
                     # For notification_preferences, also check boolean columns
                     if table_name == 'notification_preferences':
                         cursor.execute("""
-                            SELECT column_name, data_type, column_default
-                            FROM information_schema.columns
-                            WHERE table_name = 'notification_preferences'
-                            AND column_name IN ('comment_notifications', 'daily_digest', 'trending_alerts');
+                            SELECT a.attname, format_type(a.atttypid, a.atttypmod),
+                                   pg_get_expr(d.adbin, d.adrelid)
+                            FROM pg_attribute a
+                            LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+                            WHERE a.attrelid = 'notification_preferences'::regclass
+                            AND a.attname IN ('comment_notifications', 'daily_digest', 'trending_alerts')
+                            AND NOT a.attisdropped;
                         """)
                         columns = cursor.fetchall()
                         
@@ -133,38 +100,32 @@ def fix_notification_schema():
                             # Fix boolean columns with incorrect defaults
                             boolean_columns = ['comment_notifications', 'daily_digest', 'trending_alerts']
                             
-                            for col_name in boolean_columns:
-                                try:
-                                    print(f"  🔧 Fixing {col_name} column...")
-                                    
-                                    # Drop default constraint if it exists with integer value
-                                    cursor.execute(f"""
-                                        ALTER TABLE notification_preferences 
-                                        ALTER COLUMN {col_name} DROP DEFAULT;
-                                    """)
-                                    
-                                    # Set new boolean default
-                                    cursor.execute(f"""
-                                        ALTER TABLE notification_preferences 
-                                        ALTER COLUMN {col_name} SET DEFAULT TRUE;
-                                    """)
+                            try:
+                                print(f"  🔧 Fixing {', '.join(boolean_columns)} columns...")
+                                
+                                # Savepoint keeps a failure here from aborting the user_id fixes
+                                with savepoint(cursor, 'sp_bool_defaults'):
+                                    # Replace any integer defaults with boolean ones in a single ALTER
+                                    cursor.execute(
+                                        "ALTER TABLE notification_preferences "
+                                        + ", ".join(f"ALTER COLUMN {col_name} SET DEFAULT TRUE"
+                                                    for col_name in boolean_columns)
+                                    )
                                     
                                     # Update existing rows with integer values to boolean
-                                    cursor.execute(f"""
-                                        UPDATE notification_preferences 
-                                        SET {col_name} = CASE 
-                                            WHEN {col_name}::text = '1' THEN TRUE 
-                                            WHEN {col_name}::text = '0' THEN FALSE 
-                                            ELSE {col_name}
-                                        END;
-                                    """)
-                                    
-                                    print(f"    ✅ Fixed {col_name} column")
-                                    
-                                except Exception as e:
-                                    print(f"    ⚠️  Error fixing {col_name}: {e}")
-                                    # Continue with other columns
-                                    continue
+                                    cursor.execute(
+                                        "UPDATE notification_preferences SET "
+                                        + ", ".join(f"""{col_name} = CASE 
+                                                WHEN {col_name}::text = '1' THEN TRUE 
+                                                WHEN {col_name}::text = '0' THEN FALSE 
+                                                ELSE {col_name}
+                                            END""" for col_name in boolean_columns)
+                                    )
+                                
+                                print("    ✅ Fixed boolean columns")
+                                
+                            except Exception as e:
+                                print(f"    ⚠️  Error fixing boolean columns: {e}")
             
             # Commit all changes
             conn.commit()
@@ -174,28 +135,27 @@ def fix_notification_schema():
             # Test the schema with a large user ID
             print("\n🧪 Testing schema with large Telegram user ID...")
             test_user_id = 1298849354  # From your config
-            placeholder = db_conn.get_placeholder()
             
             try:
                 # Test notification_preferences insertion
                 cursor.execute(f'''
                     INSERT INTO notification_preferences (user_id, comment_notifications) 
-                    VALUES ({placeholder}, TRUE) ON CONFLICT (user_id) DO NOTHING
+                    VALUES ({PLACEHOLDER}, TRUE) ON CONFLICT (user_id) DO NOTHING
                 ''', (test_user_id,))
                 
                 cursor.execute(f'''
                     INSERT INTO notification_history 
                     (user_id, notification_type, title, content) 
-                    VALUES ({placeholder}, 'test', 'Test Notification', 'Test content')
+                    VALUES ({PLACEHOLDER}, 'test', 'Test Notification', 'Test content')
                 ''', (test_user_id,))
                 
                 conn.commit()
                 
                 # Verify insertion
-                cursor.execute(f'SELECT COUNT(*) FROM notification_preferences WHERE user_id = {placeholder}', (test_user_id,))
+                cursor.execute(f'SELECT COUNT(*) FROM notification_preferences WHERE user_id = {PLACEHOLDER}', (test_user_id,))
                 pref_count = cursor.fetchone()[0]
                 
-                cursor.execute(f'SELECT COUNT(*) FROM notification_history WHERE user_id = {placeholder}', (test_user_id,))
+                cursor.execute(f'SELECT COUNT(*) FROM notification_history WHERE user_id = {PLACEHOLDER}', (test_user_id,))
                 hist_count = cursor.fetchone()[0]
                 
                 print(f"✅ Test successful! Found {pref_count} preference(s) and {hist_count} history record(s)")
@@ -1,93 +1,109 @@
-import os
+import sys
 import psycopg2
-from dotenv import load_dotenv
+from psycopg2.pool import SimpleConnectionPool
 import time
+import random
+from pg_probe import CONNECT_OPTIONS, format_estimate, get_dsn, probe
 
-# Load environment variables
-load_dotenv()
+# Connection pool shared by every retry attempt, created on first use
+POOL = None
 
-DATABASE_URL = os.getenv('DATABASE_URL')
-print(f"Testing PostgreSQL connection...")
-print(f"Database URL: {DATABASE_URL[:50]}...")
+def get_pool():
+    """Create the connection pool on first use"""
+    global POOL
+    if POOL is None:
+        POOL = SimpleConnectionPool(minconn=1, maxconn=4, dsn=get_dsn(), **CONNECT_OPTIONS)
+    return POOL
 
-def test_connection_with_retry(max_attempts=5, delay=5):
+# SQLSTATEs that retrying can't fix: bad password, unknown database
+FATAL_SQLSTATES = frozenset({'28P01', '3D000'})
+
+def is_fatal_error(e):
+    """Tell terminal connection errors apart from transient ones"""
+    if getattr(e, 'pgcode', None) in FATAL_SQLSTATES:
+        return True
+    # Errors raised while connecting carry no pgcode, only libpq's message
+    message = str(e)
+    return ('password authentication failed' in message
+            or ('database' in message and 'does not exist' in message))
+
+def test_connection_with_retry(max_attempts=5, delay=1, max_delay=30):
     """Test PostgreSQL connection with retry logic"""
     for attempt in range(max_attempts):
         try:
             print(f"\n🔄 Attempt {attempt + 1}/{max_attempts}")
             
-            # Try with different SSL modes
-            connection_params = [
-                DATABASE_URL,  # Original URL
-                DATABASE_URL.replace('sslmode=require', 'sslmode=prefer'),
-                DATABASE_URL.replace('sslmode=require', 'sslmode=allow'),
-            ]
-            
-            for i, url in enumerate(connection_params):
-                try:
-                    print(f"  Testing connection variant {i + 1}...")
-                    conn = psycopg2.connect(url)
-                    
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT version();")
-                    version = cursor.fetchone()[0]
-                    print(f"  ✅ Connected successfully!")
-                    print(f"  PostgreSQL version: {version[:100]}...")
+            pool = get_pool()
+            conn = pool.getconn()
+            try:
+                result = probe(conn)
+                print(f"  ✅ Connected successfully!")
+                print(f"  PostgreSQL version: {result['version'][:100]}...")
+                print(f"  Available tables: {result['tables']}")
+                
+                # Check comments table specifically
+                if result['comments_exists'] and not result['comments_populated']:
+                    print("  ⚠️ Comments table is empty!")
+                elif result['comments_exists']:
+                    print(f"  Comments in database (estimated): {format_estimate(result['comments_count'])}")
                     
-                    # Test tables
-                    cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = 'public';")
-                    tables = [row[0] for row in cursor.fetchall()]
-                    print(f"  Available tables: {tables}")
-                    
-                    # Check comments table specifically
-                    if 'comments' in tables:
-                        cursor.execute("SELECT COUNT(*) FROM comments;")
-                        comment_count = cursor.fetchone()[0]
-                        print(f"  Comments in database: {comment_count}")
-                        
-                        # Show recent comments
-                        cursor.execute("SELECT comment_id, post_id, content, user_id FROM comments ORDER BY comment_id DESC LIMIT 3;")
-                        comments = cursor.fetchall()
-                        print("  Recent comments:")
-                        for comment in comments:
-                            print(f"    {comment}")
-                    else:
-                        print("  ⚠️ Comments table not found!")
-                    
-                    cursor.close()
-                    conn.close()
-                    return True
-                    
-                except psycopg2.OperationalError as e:
-                    print(f"  ❌ Connection variant {i + 1} failed: {str(e)[:100]}...")
-                    continue
+                    # Show recent comments with a single write
+                    sys.stdout.write("  Recent comments:\n"
+                                     + "".join(f"    {c}\n" for c in result['recent']))
+                else:
+                    print("  ⚠️ Comments table not found!")
+                
+                return True
+                
+            except psycopg2.OperationalError:
+                # Discard the broken connection instead of returning it to the pool
+                pool.putconn(conn, close=True)
+                conn = None
+                raise
+            finally:
+                if conn is not None:
+                    pool.putconn(conn)
                     
+        except psycopg2.OperationalError as e:
+            print(f"  ❌ Attempt {attempt + 1} failed: {str(e)[:100]}...")
+            if is_fatal_error(e):
+                print("  ⛔ This error won't go away by retrying")
+                break
         except Exception as e:
             print(f"  ❌ Attempt {attempt + 1} failed: {e}")
             
         if attempt < max_attempts - 1:
-            print(f"  ⏳ Waiting {delay} seconds before retry...")
-            time.sleep(delay)
+            # Exponential backoff with +/-20% jitter
+            sleep_s = min(max_delay, delay * (2 ** attempt)) * (0.8 + 0.4 * random.random())
+            print(f"  ⏳ Waiting {sleep_s:.1f} seconds before retry...")
+            time.sleep(sleep_s)
     
     print(f"\n❌ All connection attempts failed!")
     return False
 
 def suggest_fixes():
     """Suggest potential fixes for connection issues"""
-    print("\n🔧 POTENTIAL FIXES:")
-    print("1. Check if your PostgreSQL server is running and accessible")
-    print("2. Verify the DATABASE_URL credentials are correct")
-    print("3. Check if there are connection limits on your database")
-    print("4. Ensure your IP is whitelisted (if applicable)")
-    print("5. Try restarting your database service")
-    print("6. Check database server logs for errors")
-    
-    print("\n⚡ IMMEDIATE WORKAROUND:")
-    print("We can temporarily modify the bot to:")
-    print("- Force use SQLite for now")
-    print("- Or provide a backup connection method")
+    sys.stdout.write(
+        "\n🔧 POTENTIAL FIXES:\n"
+        "1. Check if your PostgreSQL server is running and accessible\n"
+        "2. Verify the DATABASE_URL credentials are correct\n"
+        "3. Check if there are connection limits on your database\n"
+        "4. Ensure your IP is whitelisted (if applicable)\n"
+        "5. Try restarting your database service\n"
+        "6. Check database server logs for errors\n"
+        "\n⚡ IMMEDIATE WORKAROUND:\n"
+        "We can temporarily modify the bot to:\n"
+        "- Force use SQLite for now\n"
+        "- Or provide a backup connection method\n"
+    )
 
 if __name__ == "__main__":
-    success = test_connection_with_retry()
-    if not success:
-        suggest_fixes()
+    print(f"Testing PostgreSQL connection...")
+    print(f"Database URL: {get_dsn()[:50]}...")
+    try:
+        success = test_connection_with_retry()
+        if not success:
+            suggest_fixes()
+    finally:
+        if POOL is not None:
+            POOL.closeall()
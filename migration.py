@@ -304,6 +304,32 @@ class Migration:
             except Exception as e:
                 logger.warning(f"Could not create index: {e}")
 
+def is_migration_applied(cursor, migration_id):
+    """Check schema_migrations for a completed PostgreSQL startup migration"""
+    try:
+        cursor.execute("SELECT 1 FROM schema_migrations WHERE migration_id = %s", (migration_id,))
+        return cursor.fetchone() is not None
+    except Exception as e:
+        # Marker table doesn't exist yet - clear the aborted transaction
+        logger.debug(f"Could not read schema_migrations: {e}")
+        cursor.connection.rollback()
+        return False
+
+def mark_migration_applied(cursor, migration_id, description):
+    """Record a completed PostgreSQL startup migration so later startups can skip it"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            migration_id VARCHAR(255) PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO schema_migrations (migration_id, description)
+        VALUES (%s, %s)
+        ON CONFLICT (migration_id) DO NOTHING
+    """, (migration_id, description))
+
 def run_database_migrations():
     """Run all database migrations"""
     migration = Migration()
@@ -13,6 +13,7 @@ from telegram.ext import ContextTypes
 from db_connection import get_db, get_db_connection, adapt_query
 from config import CATEGORIES
 from utils import escape_markdown_text, truncate_text
+from auto_migrate_notifications import MIGRATIONS_READY, wait_for_startup_migrations
 
 logger = logging.getLogger(__name__)
 
@@ -203,6 +204,9 @@ def get_user_preferences(user_id: int) -> Dict:
 
 def update_user_preferences(user_id: int, preferences: Dict) -> bool:
     """Update user notification preferences"""
+    # Called synchronously from async handlers, so check without blocking the event loop
+    if not wait_for_startup_migrations(timeout=0):
+        return False
     try:
         db_conn = get_db_connection()
         placeholder = db_conn.get_placeholder()
@@ -260,6 +264,9 @@ def update_user_preferences(user_id: int, preferences: Dict) -> bool:
 
 def subscribe_to_post(user_id: int, post_id: int) -> bool:
     """Subscribe user to post notifications"""
+    # Called synchronously from async handlers, so check without blocking the event loop
+    if not wait_for_startup_migrations(timeout=0):
+        return False
     try:
         db_conn = get_db_connection()
         placeholder = db_conn.get_placeholder()
@@ -333,6 +340,9 @@ async def send_notification(context: ContextTypes.DEFAULT_TYPE, user_id: int,
                           post_id: int = None, comment_id: int = None,
                           keyboard: InlineKeyboardMarkup = None) -> bool:
     """Send notification to user"""
+    # Only hop to a worker thread to wait while migrations are actually running
+    if not MIGRATIONS_READY.is_set() and not await asyncio.to_thread(wait_for_startup_migrations):
+        return False
     try:
         # Record notification in history
         db_conn = get_db_connection()
@@ -0,0 +1,118 @@
+"""Shared PostgreSQL probe used by test_postgres.py and fix_postgres_connection.py"""
+import os
+import time
+import weakref
+from functools import lru_cache
+from dotenv import load_dotenv
+
+@lru_cache(maxsize=1)
+def get_dsn():
+    """Load .env on first use, so importing for suggest_fixes() skips it"""
+    load_dotenv()
+    return os.environ['DATABASE_URL']
+
+# libpq's sslmode=prefer tries SSL and falls back to plaintext by itself, so a single
+# handshake replaces the old require/prefer/allow variants. Keyword arguments override
+# the DSN's own sslmode, or add it when the URL has none. The timeouts make a dead
+# server fail in seconds instead of the OS TCP defaults. application_name tags probe
+# sessions in pg_stat_activity, and the server-side timeouts stop a lock-blocked
+# probe from holding its connection
+CONNECT_OPTIONS = {
+    'sslmode': 'prefer',
+    'connect_timeout': 5,
+    'keepalives': 1,
+    'keepalives_idle': 10,
+    'keepalives_interval': 3,
+    'keepalives_count': 3,
+    'tcp_user_timeout': 5000,
+    'application_name': 'pg_probe',
+    'options': '-c statement_timeout=2000 -c idle_in_transaction_session_timeout=5000',
+}
+
+# Probe queries repeated on every attempt; each is prepared once per server session.
+# Row counts are the planner's reltuples estimates, a catalog lookup instead of a scan.
+# reltuples is -1 until the table is first analyzed (PG14+), reported as NULL
+PROBE_QUERIES = {
+    'probe_version': """
+        SELECT version(),
+               to_regclass('public.comments') IS NOT NULL,
+               (SELECT NULLIF(reltuples, -1)::bigint FROM pg_class
+                WHERE oid = to_regclass('public.posts'))
+    """,
+    'probe_comments': """
+        SELECT json_build_object(
+            'comments_populated', EXISTS (SELECT 1 FROM comments),
+            'comments_count', (SELECT NULLIF(reltuples, -1)::bigint FROM pg_class
+                               WHERE oid = 'public.comments'::regclass),
+            -- Positional rows (comment_id, post_id, content, user_id, timestamp)
+            -- like the default tuple cursor, instead of one object per row
+            'recent', (SELECT json_agg(json_build_array(
+                comment_id, post_id, content, user_id, timestamp)) FROM (
+                SELECT comment_id, post_id, content, user_id, timestamp
+                FROM comments ORDER BY comment_id DESC LIMIT 5
+            ) c)
+        )
+    """,
+}
+
+# Statement names already prepared, per connection; entries go away with the connection
+_PREPARED = weakref.WeakKeyDictionary()
+
+def execute_probe(cursor, name):
+    """Run a probe query, preparing it on first use on this connection"""
+    prepared = _PREPARED.setdefault(cursor.connection, set())
+    if name not in prepared:
+        # Prepared statements outlive a rollback, so record the name as soon as
+        # PREPARE succeeds, even if the EXECUTE below fails
+        cursor.execute(f"PREPARE {name} AS {PROBE_QUERIES[name]};")
+        prepared.add(name)
+    cursor.execute(f"EXECUTE {name};")
+
+# Public table names per DSN: {dsn: (fetched_at, tables)}
+_SCHEMA_CACHE = {}
+
+def list_tables(conn, ttl=60):
+    """List public tables, reusing the result for ttl seconds per DSN"""
+    fetched_at, tables = _SCHEMA_CACHE.get(conn.dsn, (0, None))
+    if time.time() - fetched_at < ttl:
+        return tables
+    
+    # Server-side cursor streams rows in itersize chunks instead of one fetchall()
+    with conn.cursor(name='list_tables') as cursor:
+        cursor.itersize = 1000
+        # pg_class directly, information_schema.tables is a view joining several catalogs
+        cursor.execute("""
+            SELECT relname FROM pg_class
+            WHERE relnamespace = 'public'::regnamespace AND relkind IN ('r', 'p');
+        """)
+        tables = [row[0] for row in cursor]
+    _SCHEMA_CACHE[conn.dsn] = (time.time(), tables)
+    return tables
+
+def format_estimate(value):
+    """Render a row estimate, which is None when the table was never analyzed"""
+    return 'unknown' if value is None else str(value)
+
+def probe(conn):
+    """Collect server version, tables, row estimates and recent comments"""
+    with conn.cursor() as cursor:
+        execute_probe(cursor, 'probe_version')
+        version, comments_exists, posts_count = cursor.fetchone()
+        result = {
+            'version': version,
+            'tables': list_tables(conn),
+            'comments_exists': comments_exists,
+            'comments_populated': False,
+            'comments_count': None,
+            'recent': [],
+            'posts_count': posts_count,
+        }
+        
+        if comments_exists:
+            # Comment estimate and recent comments in one round-trip
+            execute_probe(cursor, 'probe_comments')
+            stats = cursor.fetchone()[0]
+            result['comments_populated'] = stats['comments_populated']
+            result['comments_count'] = stats['comments_count']
+            result['recent'] = [tuple(row) for row in stats['recent'] or []]
+    return result
@@ -1,57 +1,32 @@
-import os
+import sys
+import contextlib
 import psycopg2
-from dotenv import load_dotenv
+from pg_probe import CONNECT_OPTIONS, format_estimate, get_dsn, probe
 
-# Load environment variables
-load_dotenv()
-
-DATABASE_URL = os.getenv('DATABASE_URL')
-print(f"Database URL: {DATABASE_URL[:50]}...")
+print(f"Database URL: {get_dsn()[:50]}...")
 
 try:
-    print("Attempting to connect to PostgreSQL...")
-    conn = psycopg2.connect(DATABASE_URL)
-    print("✅ Connected successfully!")
-    
-    cursor = conn.cursor()
-    
-    # Test query
-    cursor.execute("SELECT version();")
-    version = cursor.fetchone()
-    print(f"PostgreSQL version: {version[0]}")
-    
-    # Check if comments table exists
-    cursor.execute("""
-        SELECT EXISTS (
-            SELECT FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            AND table_name = 'comments'
-        );
-    """)
-    comments_table_exists = cursor.fetchone()[0]
-    print(f"Comments table exists: {comments_table_exists}")
-    
-    if comments_table_exists:
-        # Count comments
-        cursor.execute("SELECT COUNT(*) FROM comments;")
-        comment_count = cursor.fetchone()[0]
-        print(f"Total comments in PostgreSQL: {comment_count}")
+    with contextlib.ExitStack() as stack:
+        print("Attempting to connect to PostgreSQL...")
+        # closing() closes the connection, the connection itself rolls back on error
+        conn = stack.enter_context(contextlib.closing(psycopg2.connect(get_dsn(), **CONNECT_OPTIONS)))
+        stack.enter_context(conn)
+        print("✅ Connected successfully!")
+        
+        result = probe(conn)
+        print(f"PostgreSQL version: {result['version']}")
+        print(f"Comments table exists: {result['comments_exists']}")
+        
+        if result['comments_exists'] and not result['comments_populated']:
+            print("Comments table is empty")
+        elif result['comments_exists']:
+            print(f"Total comments in PostgreSQL (estimated): {format_estimate(result['comments_count'])}")
+            sys.stdout.write("Recent comments:\n"
+                             + "".join(f"  {c}\n" for c in result['recent']))
+        
+        # Check posts
+        print(f"Total posts in PostgreSQL (estimated): {format_estimate(result['posts_count'])}")
         
-        # Show recent comments
-        cursor.execute("SELECT comment_id, post_id, content, user_id, timestamp FROM comments ORDER BY comment_id DESC LIMIT 5;")
-        comments = cursor.fetchall()
-        print("Recent comments:")
-        for comment in comments:
-            print(f"  {comment}")
-    
-    # Check posts
-    cursor.execute("SELECT COUNT(*) FROM posts;")
-    post_count = cursor.fetchone()[0]
-    print(f"Total posts in PostgreSQL: {post_count}")
-    
-    cursor.close()
-    conn.close()
-    
 except Exception as e:
     print(f"❌ Connection failed: {e}")
     print(f"Error type: {type(e).__name__}")